@@ -0,0 +1,22 @@
+import time
+
+# Best time per call over a number of rounds
+
+def measure(label, fnc, number=10000, repeat=5):
+
+    best = None
+
+    for _ in range(repeat):
+        beg = time.perf_counter()
+        for _ in range(number): fnc()
+        tim = (time.perf_counter() - beg) / number
+        if best is None or tim < best: best = tim
+
+    report(label, best)
+
+    return best
+
+def report(label, secs):
+
+    txt = f"{secs*1e3:9.2f} ms" if secs >= 1e-3 else f"{secs*1e6:9.2f} µs"
+    print(f"{label:<44} : {txt}")
@@ -1,10 +1,17 @@
 import site
-import time
 import importlib
 import traceback
 import atexit
-from prompt_toolkit import PromptSession
-from prompt_toolkit.history import FileHistory
+import weakref
+import gc
+import time
+import re
+import threading
+import contextvars
+import asyncio
+import json
+import socket
+import string
 
 from dynashell.utils import *
 import dynashell.feature as feature
@@ -24,6 +31,16 @@ class Shell:
         if not is_none(Shell.Instance): log_failure("Only 1 instance of Shell allowed")
         Shell.Instance = self
 
+        # Per command state (see scope())
+
+        self._scope     = contextvars.ContextVar('scope')
+        self._recent    = None
+        self._lock      = threading.RLock()
+        self._pool      = None
+        self._loop      = None
+        self._jobs      = {}
+        self._jobid     = 0
+
         # Public properties
 
         self.cmdline    = Command(line)
@@ -31,6 +48,7 @@ class Shell:
         self.setting    = {}
         self.command    = None
         self.reader     = None
+        self.status     = 0
 
         # Private properties
 
@@ -41,6 +59,14 @@ class Shell:
         self._variable  = {}
         self._parser    = []
         self._executor  = []
+        self._enter     = []
+        self._cache     = {}
+        self._route     = {}
+        self._shadowed  = set()
+        self._linked    = weakref.WeakValueDictionary()
+        self._kept      = {}
+        self._header    = None
+        self._started   = False
 
         # Declare cmdline
 
@@ -65,6 +91,16 @@ class Shell:
         self.config = self.load(config_file,True)
         self.set("config",self.config,declared=True,protect=True)
 
+        # Register builtin commands
+
+        self.builtin('modules',lambda self,cmnd: self.report(self.modules()))
+        self.builtin('rescan',lambda self,cmnd: self._cache['source'].rescan())
+        self.builtin('parallel',lambda self,cmnd: self.parallel(*split_line(cmnd.text,';')))
+        self.builtin('jobs',lambda self,cmnd: self.jobs())
+        self.builtin('wait',lambda self,cmnd: self.wait(cmnd.pop()))
+        self.builtin('cancel',lambda self,cmnd: self.cancel(cmnd.pop()))
+        self.builtin('route',lambda self,cmnd: self.report(self.routing(cmnd.text)))
+
         # Process config.feature section
 
         lst = self.config.get('feature',[])
@@ -109,9 +145,23 @@ class Shell:
         self.setting = Dictionary(setting)
         self.set("setting",self.setting,declared=True,protect=True)
 
-        # Handle USE_READLINE
+        # Create compiled script cache
+
+        self._cache['link'] = LruCache(int(self.setting.LINK_CACHE))
+
+        # Create template cache
 
-        if self.setting.USE_READLINE: import readline
+        self._cache['template'] = LruCache(int(self.setting.TEMPLATE_CACHE))
+
+        # Create parsed source cache
+
+        self._cache['parse'] = LruCache(int(self.setting.PARSE_CACHE))
+
+        # Determine store path (for persistent dynascript bytecode, optional)
+
+        if self.setting.LINK_STORE:
+            self._path['store'] = slashed_path(self.path(self.setting.LINK_STORE))
+            create_dir(self._path['store'])
 
         # Determine temp path (for dynascript storage)
 
@@ -140,6 +190,10 @@ class Shell:
             pth = slashed_path(self.path(itm))
             self._source.append(pth)
 
+        # Create script index on the source directories
+
+        self._cache['source'] = Index(self._source,float(self.setting.SOURCE_CHECK))
+
         # Process config.import section
 
         lst = self.config.get('import',[])
@@ -148,12 +202,12 @@ class Shell:
 
         # Define atexit handler to deal with ctrl-c exit
 
-        atexit.register(lambda : Shell.Instance.shutdown())
+        atexit.register(lambda : Shell.Instance.shutdown(exiting=True))
 
         # Create reader
 
         self.config.running=True
-        self.reader = Reader(self)
+        self.reader = self.create_reader()
 
         # Execute startup scripts
 
@@ -162,11 +216,36 @@ class Shell:
         # Start reader
 
         self.reader.start()
+        if self.reader.failed: self.status = 1
 
         # Execute shutdown scripts
 
         self.shutdown()
 
+    def create_reader(self):
+
+        # Daemon mode : --serve=<socket file> (default shell:/dynashell.sock)
+
+        serve = self.cmdline.flag.get('serve')
+
+        if serve:
+            return Server(self,self.path("shell:/dynashell.sock" if serve is True else serve))
+
+        # Batch mode : --batch=<file>, --batch (or --batch=-) for stdin, or piped stdin
+
+        batch = self.cmdline.flag.get('batch')
+
+        if batch is None and self.cmdline.flag.get('stdin',True) and not sys.stdin.isatty():
+            batch = True
+
+        if batch is None or batch is False:
+            return Reader(self)
+
+        if batch is True or batch == '-':
+            return Batch(self,sys.stdin)
+
+        return Batch(self,open(self.path(batch),'r'))
+
     def feature(self,cfg):
 
         if cfg.get('field'):
@@ -178,10 +257,14 @@ class Shell:
 
         if cfg.get('parser'):
             self._parser.append(cfg.get('parser'))
+            self.reparse()
 
         if cfg.get('executor'):
             self._executor.append(cfg.get('executor'))
 
+        if cfg.get('enter'):
+            self._enter.append(cfg.get('enter'))
+
     def startup(self):
 
         # Execute STARTUP scripts
@@ -190,41 +273,170 @@ class Shell:
 
         # Execute startup scripts
 
-        for itm in self.config.get('startup',[]): self.execute(Command(itm))
+        self.schedule('startup', self.config.get('startup',[]))
+
+        self._started = True
+
+    def plan(self,entries):
+
+        # Entries are command lines or {run: <line>, name: <id>, after: [<id>, ...]}. A plain
+        # line runs after the previous entry, so a list of lines keeps its sequential order.
+
+        graph = {}
+        lines = {}
+        prev  = None
+
+        for itm in entries or []:
+
+            if isinstance(itm,dict):
+                line  = str(itm['run'])
+                name  = str(itm.get('name',line))
+                after = itm.get('after',[])
+                after = [after] if isinstance(after,str) else [str(dep) for dep in after]
+            else:
+                line  = str(itm)
+                name  = line
+                after = [prev] if prev is not None else []
+
+            if name in graph: name = f"{name}#{len(graph)}"
+
+            graph[name] = after
+            lines[name] = line
+            prev = name
+
+        return (graph,lines)
+
+    def schedule(self,section,entries):
+
+        (graph,lines) = self.plan(entries)
+
+        # Sequential : run in the calling thread, as before
+
+        if not any(isinstance(itm,dict) for itm in entries or []):
+            for name in graph: self.execute(Command(lines[name]))
+            return
+
+        # Dependencies : run independent entries concurrently
 
-    def shutdown(self):
+        try:
+            tasks  = {name: self.isolated(self.execute, Command(line)) for name,line in lines.items()}
+            result = run_graph(graph, lambda name: tasks[name]())
+        except ValueError as e:
+            log_error(f"{section} : {e}")
+            return
+
+        self.timing(section, graph, result)
+
+    def timing(self,section,graph,result):
+
+        key = section.upper()
 
-        if self.config.running:
+        for name,hsh in result.items():
+            tim = f"{hsh['ended'] - hsh['started']:.3f}s" if hsh['ended'] is not None else '-'
+            print(f"{key:<8} : {tim:>8} {hsh['state']:<8} {name}")
 
-            # Execute shutdown scripts
+        (tim,path) = critical_path(graph, result)
 
-            for itm in self.config.get('shutdown',[]): self.execute(Command(itm))
+        print(f"{key:<8} : {tim:7.3f}s critical path {' -> '.join(path)}")
 
-            # Execute SHUTDOWN scripts
+    def shutdown(self,exiting=False):
 
-            for itm in self.resolve("SHUTDOWN", collect=True): self.link(self.source(itm))
+        with self._lock:
 
-            # Only run shutdown() once.
+            # Only run shutdown() once, also when ctrl-c hits while it runs
 
+            if not self.config.running: return
             self.config.running=False
 
+        # Execute shutdown scripts, then SHUTDOWN scripts
+
+        (graph,lines) = self.plan(self.config.get('shutdown',[]))
+
+        tasks = {name: self.isolated(self.execute, Command(line)) for name,line in lines.items()}
+        prev  = list(graph)[-1] if graph else None
+
+        for itm in self.resolve("SHUTDOWN", collect=True):
+            graph[itm] = [prev] if prev is not None else []
+            tasks[itm] = self.isolated(lambda itm=itm: self.link(self.source(itm)))
+            prev = itm
+
+        if graph:
+
+            timeout = self.setting.SHUTDOWN_TIMEOUT
+            limit   = self.setting.SHUTDOWN_LIMIT
+            timeout = float(timeout) if timeout is not None else None
+            limit   = float(limit) if limit is not None else None
+
+            # A plain list runs in the calling thread, as before (cleanup can be thread
+            # affine), so does everything when called from atexit (no new threads then).
+            # Entries run that way can't be abandoned, so they are not bounded either :
+            # every one of them runs.
+
+            mapping = any(isinstance(itm,dict) for itm in self.config.get('shutdown',[]) or [])
+            inline  = exiting or not mapping
+
+            if inline: (timeout,limit) = (None,None)
+
+            try:
+                result = run_graph(graph, lambda name: tasks[name](), False, timeout, limit, inline)
+            except ValueError as e:
+                log_error(f"shutdown : {e}")
+                chain  = list(graph)
+                graph  = {name: chain[idx-1:idx] for idx,name in enumerate(chain)}
+                result = run_graph(graph, lambda name: tasks[name](), False, timeout, limit, inline)
+
+            states = [hsh['state'] for hsh in result.values()]
+
+            if mapping or states.count('done') < len(states):
+                self.timing('shutdown', graph, result)
+                print(f"SHUTDOWN : " + ', '.join(f"{states.count(itm)} {itm}" for itm in ('done','failed','timeout','skipped')))
+
+        # Stop the event loop and the worker pool
+
+        if self._loop is not None: self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._pool is not None: self._pool.shutdown()
+
     def enter(self):
 
+        for fnc in self._enter: fnc(self)
+
         self.clear()
 
     def execute(self,cmnd):
 
+        saved = self.command
+
         try:
 
-            saved = self.command
+            # Background job : <command> --background (a --background=<value> flag is
+            # left to the command itself)
+
+            if cmnd.flag.get('background') is True:
+                cmnd.flag.pop('background',None)
+                self.background(cmnd)
+                return True
 
             self.command = cmnd
-            self.set("command",cmnd,declared=True)
+            self.set("command",cmnd,declared=True,transient=True)
+
+            if saved is None: self._recent = self.scope()
+
+            # Try the routing table (builtins, handlers, processors)
 
-            # Try executors
+            hit = self._route.get(cmnd.name)
+            if hit is not None:
+                (kind,fnc,_) = hit
+                if kind == 'builtin':
+                    if not self.shadowed(cmnd.name):
+                        fnc(self,cmnd)
+                        return True
+                elif fnc(self,cmnd):
+                    return True
+
+            # Try generic executors
 
             for fnc in self._executor:
-                if fnc(self,cmnd): return
+                if fnc(self,cmnd): return True
 
             # Default
 
@@ -233,10 +445,205 @@ class Shell:
 
             self.link(source, label)
 
-            self.command = saved
+            return True
 
         except:
             traceback.print_exc()
+            return False
+
+        finally:
+
+            self.command = saved
+            if saved is not None: self.set("command",saved,declared=True,transient=True)
+
+    @property
+    def command(self):
+
+        return self.scope().command
+
+    @command.setter
+    def command(self,cmnd):
+
+        self.scope().command = cmnd
+
+    def scope(self):
+
+        # The state of the running command lives in a context variable, so commands
+        # submitted to the worker pool each see their own command and transients.
+
+        # Threads started by a script itself (an executor, driver callbacks) have no scope
+        # of their own : they share the one of the most recent top-level command.
+
+        scp = self._scope.get(None)
+
+        if scp is None:
+            scp = self._recent
+            if scp is None:
+                scp = Scope()
+                self._scope.set(scp)
+
+        return scp
+
+    def isolated(self,fnc,*args,**kwargs):
+
+        # Bind fnc to a copy of the caller's context (so output still goes to the caller's
+        # target) with a fresh scope. The returned callable can run on any thread.
+
+        ctx = contextvars.copy_context()
+
+        def scoped():
+            self._scope.set(Scope())
+            return fnc(*args,**kwargs)
+
+        return lambda: ctx.run(scoped)
+
+    def pool(self):
+
+        with self._lock:
+            if self._pool is None: self._pool = Pool(int(self.setting.WORKER_COUNT))
+
+        return self._pool
+
+    def submit(self,cmnd):
+
+        # Execute a command on the worker pool, the future resolves to its success
+
+        if isinstance(cmnd,str): cmnd = Command(cmnd)
+
+        return self.pool().submit(self.isolated(self.execute,cmnd))
+
+    def parallel(self,*lines):
+
+        # Execute commands concurrently and wait for all of them
+
+        lst = [self.submit(line.strip()) for line in lines if len(line.strip())]
+        res = [itm.result() for itm in lst]
+
+        if not all(res): log_failure(f"{res.count(False)} of {len(res)} parallel commands failed")
+
+        return res
+
+    def loop(self):
+
+        # Persistent event loop (on its own thread) shared by all commands, so async
+        # clients created by one command can be used by the next.
+
+        with self._lock:
+
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever,daemon=True,name="dynashell-loop").start()
+
+        return self._loop
+
+    def run(self,coro):
+
+        # Run a coroutine on the shell event loop and wait for its result. The
+        # coroutine sees the context of the caller (command, output target).
+
+        loop = self.loop()
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is loop: log_failure("shell.run() can't be called from the shell event loop, use await")
+
+        ctx = contextvars.copy_context()
+
+        async def scoped():
+            for var,val in ctx.items(): var.set(val)
+            return await coro
+
+        return asyncio.run_coroutine_threadsafe(scoped(),loop).result()
+
+    def background(self,cmnd):
+
+        # Execute a command as a background job, its output is captured in the job
+
+        if isinstance(cmnd,str): cmnd = Command(cmnd)
+
+        with self._lock:
+            self._jobid += 1
+            job = Job(self._jobid,f"{cmnd.name} {cmnd.text}".strip())
+            self._jobs[job.id] = job
+
+        Output.Install()
+
+        # The job (and its future) is complete before it is queued, a fast job may end
+        # before submit returns
+
+        self.pool().put(job.future,self.isolated(self.run_job,job,cmnd))
+        print(f"[{job.id}] {job.line}")
+
+        return job
+
+    def run_job(self,job,cmnd):
+
+        self.scope().job = job
+        job.started = time.time()
+
+        token = Output.Target.set(job)
+        try:
+            done = self.execute(cmnd)
+        finally:
+            Output.Target.reset(token)
+            job.ended = time.time()
+
+        job.done = done
+        print(f"[{job.id}] {job.status()} {job.line}")
+
+        return done
+
+    def job(self,jid):
+
+        job = self._jobs.get(str_to_type(jid))
+        if job is None: log_failure(f"No job with id '{jid}'")
+
+        return job
+
+    def jobs(self):
+
+        for job in list(self._jobs.values()):
+            print(f"[{job.id}] {job.status():<9} {job.elapsed():8.1f}s  {job.line}")
+
+    def wait(self,jid=None):
+
+        # Wait for one job (or all of them), print its captured output and remove it
+
+        lst = [self.job(jid)] if jid is not None else list(self._jobs.values())
+        ok  = True
+
+        for job in lst:
+
+            if not job.future.cancelled(): job.future.result()
+
+            print(''.join(job.output),end='')
+
+            ok = ok and (job.done or job.future.cancelled())
+            self._jobs.pop(job.id,None)
+
+        if not ok: log_failure("Job failed")
+
+    def cancel(self,jid):
+
+        # Pending jobs are dropped, running jobs are asked to stop (see cancelled())
+
+        job = self.job(jid)
+        job.cancel = True
+
+        if job.future.cancel():
+            print(f"[{job.id}] cancelled {job.line}")
+        else:
+            print(f"[{job.id}] cancel requested {job.line}")
+
+    def cancelled(self):
+
+        # Scripts running as a background job can poll this to stop early
+
+        job = self.scope().job
+        return job is not None and job.cancel
 
     def leave(self):
 
@@ -246,25 +653,89 @@ class Shell:
 
         if not is_empty(source):
 
-            time.sleep(float(self.setting.LINK_DELAY))
+            with self._lock:
+                modname = f"script{self._counter}"
+                self._counter += 1
+
+            try:
 
-            src = self.compile(source, label)
+                if self.setting.LINK_DEBUG:
+                    save_file(self.path(f"temp:{modname}.py"),self.compile(source, label))
+                    importlib.invalidate_caches()
+                    mod = importlib.import_module(modname)
+                else:
+                    mod=import_from_string(modname,self.bytecode(source),self.namespace(),self.declared())
 
-            modname = f"script{self._counter}"
-            self._counter += 1
+                self._linked[modname] = Anchor(mod.__dict__)
 
-            if self.setting.LINK_DEBUG:
-                save_file(self.path(f"temp:{modname}.py"),src)
-                mod = importlib.import_module(modname)
-            else:
-                mod=import_from_string(modname,src)
+                # call onImport (optional)
+
+                if hasattr(mod,"onImport"): getattr(mod,"onImport")(self,mod)
+
+                # run async entry point on the shell event loop (optional)
+
+                fnc = mod.__dict__.get('main')
+                if inspect.iscoroutinefunction(fnc) and fnc.__module__ == modname:
+                    self.run(fnc(self,self.command))
+
+                # Scripts that set __keep__ stay registered (up to LINK_KEEP of them)
+
+                if mod.__dict__.get('__keep__'): self.keep(mod)
+
+            finally:
+
+                if modname not in self._kept: sys.modules.pop(modname,None)
+
+    def keep(self,mod):
+
+        with self._lock:
+
+            self._kept[mod.__name__] = mod
 
-            # call onImport (optional)
+            while len(self._kept) > int(self.setting.LINK_KEEP):
+                name = next(iter(self._kept))
+                del self._kept[name]
+                sys.modules.pop(name,None)
 
-            if hasattr(mod,"onImport"): getattr(mod,"onImport")(self,mod)
+    def modules(self):
+
+        # Script globals stay alive as long as anything refers to them : the module, or
+        # a function the script registered (through its __globals__).
+
+        gc.collect()
+
+        alive = list(self._linked.values())
+
+        return {
+            'linked' : self._counter - 100,
+            'alive'  : len(alive),
+            'kept'   : len(self._kept),
+            'bytes'  : sum(sizeof_namespace(anc.hsh) for anc in alive)
+        }
 
     def compile(self, source, label):
 
+        tmp = self.prologue()
+
+        # Add declared variables
+
+        lst = list(self.declared().keys())
+
+        if len(lst):
+            tmp += "# Declared Variables\n\n"
+            for key in lst:
+                tmp += f"{key} = shell.get('{key}')\n"
+            tmp += "\n"
+
+        # Add script source
+
+        tmp += f"# Source '{label}'\n\n"
+        tmp += source
+
+        return tmp
+
+    def prologue(self):
+
         tmp = ""
 
         # Global imports
@@ -286,31 +757,138 @@ class Shell:
         tmp += "from dynashell.main import instance\n"
         tmp += "shell = instance()\n\n"
 
-        # Add declared variables
+        return tmp
 
-        lst = []
+    def namespace(self):
 
-        for key,cfg in self._variable.items():
-            if cfg.get('declared'): lst.append(key)
+        # The prologue (including the configured include) is executed into a shared
+        # namespace whose names are copied into every script module. Until startup is
+        # done it is executed for every script, as the include may read state set by
+        # the startup scripts. After that it is kept, and only executed again when
+        # the include changes.
 
-        if len(lst):
-            tmp += "# Declared Variables\n\n"
-            for key in lst:
-                tmp += f"{key} = shell.get('{key}')\n"
-            tmp += "\n"
+        inc = self.config.get('include')
 
-        # Add script source
+        if self._header is None or self._header[0] != inc:
 
-        tmp += f"# Source '{label}'\n\n"
-        tmp += source
+            hsh = {'__name__':'include'}
+            exec(compile(self.prologue(),'<include>','exec'),hsh)
 
-        return tmp
+            hsh = {key:val for key,val in hsh.items() if not key.startswith('__')}
+            if not self._started: return hsh
+
+            self._header = (inc,hsh)
+
+        return self._header[1]
+
+    def declared(self):
+
+        hsh = {key:cfg.get('value') for key,cfg in self._variable.items() if cfg.get('declared')}
+        hsh.update({key:cfg.get('value') for key,cfg in self.scope().variable.items() if cfg.get('declared')})
+
+        return hsh
+
+    def bytecode(self, src):
+
+        # Scripts are compiled without header or declared variables (these are
+        # seeded into the module), so the script text is its own cache key.
+
+        cache = self._cache['link']
+
+        code = cache.get(src)
+        if code is not None: return code
+
+        # Try the persistent store (validated by source hash and python magic number)
+
+        store = self._path.get('store')
+
+        if store:
+
+            digest = hashlib.sha256(src.encode()).digest()
+            file   = f"{store}/{digest.hex()}.pyc"
+
+            code = load_code(file,digest)
+            if code is None:
+                code = compile(src,'<string>','exec')
+                save_code(file,digest,code)
+
+        else:
+
+            code = compile(src,'<string>','exec')
+
+        return cache.put(src,code)
+
+    def builtin(self,name,fnc):
+
+        self.route(name,fnc,'builtin')
+
+    def route(self,name,fnc,kind='executor',target=None):
+
+        # Route commands called name to fnc(shell,cmnd), an executor returning False
+        # falls through to the generic executors and the script index. The target is
+        # what fnc dispatches to, for reporting.
+
+        hit = self._route.get(name)
+        if hit is not None and hit[1] is not fnc: log_warning(f"Route for '{name}' ({hit[0]}) replaced by {kind}")
+
+        self._route[name] = (kind,fnc,target if target is not None else fnc)
+
+    def shadowed(self,name):
+
+        # A script named like a builtin takes precedence over it (a new script is seen
+        # within SOURCE_CHECK seconds, no directory is checked for every builtin call)
+
+        lst = self._cache['source'].lookup(name,False,False)
+
+        if lst and name not in self._shadowed:
+            self._shadowed.add(name)
+            log_warning(f"Script {lst[0]} shadows builtin '{name}'")
+
+        return len(lst) > 0
+
+    def routing(self,line):
+
+        # Routing decision for a command line and the cost of making it
+
+        cmnd = Command(line)
+        name = cmnd.name
+        ret  = {'command': name}
+
+        beg = time.perf_counter_ns()
+        for _ in range(1000): hit = self._route.get(name)
+        ret['lookup'] = f"{(time.perf_counter_ns() - beg) / 1000:.0f} ns"
+
+        if hit is not None:
+            (kind,fnc,target) = hit
+            ret['route']  = kind
+            ret['target'] = ', '.join(str(key) for key in target if key is not None) if isinstance(target,dict) else getattr(target,'__qualname__',repr(target))
+            if kind == 'builtin':
+                if not self.shadowed(name): return ret
+                ret['route'] = 'builtin (shadowed by script)'
+
+        if self._executor:
+            ret['then'] = ', '.join(getattr(fnc,'__qualname__',repr(fnc)) for fnc in self._executor)
+
+        beg = time.perf_counter_ns()
+        for _ in range(100): src = self.resolve(name)
+        ret['script'] = src if src else None
+        ret['resolve'] = f"{(time.perf_counter_ns() - beg) / 100:.0f} ns"
+
+        return ret
+
+    def report(self,hsh):
+
+        for key,val in hsh.items(): print(f"{key:<8} : {val}")
+
+    def stats(self):
+
+        return {key:cache.stats() for key,cache in self._cache.items()}
 
     def resolve(self,name,collect=False):
 
         # If already resolved previously, just return it
 
-        if is_file(name): return name
+        if "/" in name and is_file(name): return name
 
         # Needed for collect
 
@@ -327,7 +905,14 @@ class Shell:
                 else:
                     return name
 
-        # implicit source
+        # implicit source (indexed)
+
+        elif "/" not in name:
+
+            lst = self._cache['source'].find(name,collect)
+            if not collect: return lst[0] if lst else None
+
+        # implicit source (in a sub directory)
 
         else:
 
@@ -348,12 +933,54 @@ class Shell:
         file = self.resolve(name)
 
         if file:
-            return self.parse(load_file(file))
+            return self.parse_file(file)
 
         if not silent: log_failure(f"Could not find source for '{name}'")
 
         return None
 
+    def parse_file(self,file):
+
+        # Parser output is cached per file and valid for as long as the file and every
+        # file it (transitively) included keep their modification time and size.
+
+        cache = self._cache['parse']
+        entry = cache.get(file)
+
+        if entry is not None:
+            (src,deps) = entry
+            if all(file_stamp(itm)==stamp for itm,stamp in deps.items()):
+                self.depend(deps)
+                return src
+
+        depends = self.scope().depends
+        depends.append({file:file_stamp(file)})
+
+        try:
+            src  = self.parse(load_file(file))
+            deps = depends[-1]
+        finally:
+            depends.pop()
+
+        cache.put(file,(src,deps))
+        self.depend(deps)
+
+        return src
+
+    def depend(self,deps):
+
+        # Add dependencies to the file currently being parsed (if any)
+
+        depends = self.scope().depends
+        if len(depends): depends[-1].update(deps)
+
+    def reparse(self):
+
+        # Parser output depends on registered macros, formatters and scripter
+        # headers : drop it whenever those change.
+
+        if self._cache.get('parse'): self._cache['parse'].clear()
+
     def parse(self,src):
 
         # Get rid of leading/trailing spaces
@@ -418,64 +1045,273 @@ class Shell:
 
     def set(self,key,val,declared=False,protect=False,transient=False):
 
-        if self.has(key):
-            if self._variable.get(key).get('protect'): log_failure(f"Cannot reset protected variable {key}")
+        cfg = self.has(key)
+        if cfg:
+            if cfg.get('protect'): log_failure(f"Cannot reset protected variable {key}")
+
+        # Transient variables belong to the running command (its scope)
+
+        scope = self.scope().variable
 
         if val is None:
-            del self._variable[key]
+            if key in scope:
+                del scope[key]
+            else:
+                del self._variable[key]
         else:
-            self._variable[key]={'value':val,'declared':declared,'protect':protect,'transient':transient}
+            cfg = {'value':val,'declared':declared,'protect':protect,'transient':transient}
+            if transient:
+                scope[key] = cfg
+            else:
+                scope.pop(key,None)
+                self._variable[key] = cfg
 
     def get(self,key,default=None):
 
-        if self.has(key):
-            return self._variable.get(key).get('value')
+        cfg = self.has(key)
+
+        if cfg:
+            return cfg.get('value')
         else:
             return default
 
     def has(self,key):
 
-        return self._variable.get(key,False)
+        return self.scope().variable.get(key) or self._variable.get(key,False)
 
     def clear(self):
 
-        lst = []
-        for key,cfg in self._variable.items():
-            if cfg.get('transient'):
-                lst.append(key)
-
-        for key in lst:
-                del self._variable[key]
+        self.scope().variable.clear()
 
     def render(self,txt,hsh=None,partial=False):
 
-        if hsh is None: hsh = {}
+        tpl = txt if isinstance(txt,Template) else self.template(txt)
+        if tpl.static is not None: return tpl.static
+
+        # Fields resolve from hsh, then setting, then the command values. Layers look
+        # keys up with 'in', so anything but a plain dict is flattened first.
+
+        if hsh and not isinstance(hsh,dict):
+            hsh = Dictionary.Payload(hsh) if isinstance(hsh,Dictionary) else dict(hsh)
+
+        setting = Dictionary.Payload(self.setting)
+        value   = Dictionary.Payload(self.command.value)
+
+        return tpl.render(Layers(hsh,setting,value) if hsh else Layers(setting,value),partial)
+
+    def template(self,txt):
+
+        cache = self._cache['template']
+
+        tpl = cache.get(txt)
+        if tpl is None: tpl = cache.put(txt,Template(txt))
+
+        return tpl
+
+class Anchor:
+
+    # Stored in a script namespace, so the namespace can be tracked weakly (dicts
+    # can't be) : the anchor lives exactly as long as the namespace that holds it.
+
+    __slots__ = ('hsh','__weakref__')
+
+    def __init__(self,hsh):
+
+        self.hsh = hsh
+        hsh['__anchor__'] = self
+
+class Scope:
+
+    # State of a running command : the command itself, its transient variables and
+    # the dependencies of the sources being parsed for it.
+
+    def __init__(self):
+
+        self.command  = None
+        self.variable = {}
+        self.depends  = []
+        self.job      = None
+
+class Job:
+
+    # Background job : its future, timing and captured output
+
+    def __init__(self,jid,line):
+
+        self.id      = jid
+        self.line    = line
+        self.future  = Future()
+        self.started = None
+        self.ended   = None
+        self.done    = None
+        self.cancel  = False
+        self.output  = []
 
-        hsh = {**self.command.value,**self.setting,**hsh}
+    def write(self,key,txt):
 
-        if partial:
+        self.output.append(txt)
+        return len(txt)
 
-            class _format(dict):
-                def __missing__(self, key):
-                    return "{" + key + "}"
+    def status(self):
 
-            hsh = _format(hsh)
-            return txt.format_map(hsh)
+        if self.future is not None and self.future.cancelled(): return 'cancelled'
+        if self.started is None:    return 'pending'
+        if self.ended is None:      return 'running'
+        return 'done' if self.done else 'failed'
 
+    def elapsed(self):
+
+        if self.started is None: return 0.0
+        return (self.ended or time.time()) - self.started
+
+class Output:
+
+    # Stands in for sys.stdout/sys.stderr : writes go to the target selected for
+    # the current context (a background job, a client connection) or else to the
+    # original stream.
+
+    Target = contextvars.ContextVar('output',default=None)
+
+    def __init__(self,stream,key):
+
+        self.stream = stream
+        self.key    = key
+
+    def write(self,txt):
+
+        target = Output.Target.get()
+        if target is None: return self.stream.write(txt)
+
+        # A client that went away (job output after a disconnect) falls back to the stream
+
+        try:
+            return target.write(self.key,txt)
+        except OSError:
+            return self.stream.write(txt)
+
+    def flush(self):
+
+        if Output.Target.get() is None: self.stream.flush()
+
+    def __getattr__(self,key):
+
+        return getattr(self.stream,key)
+
+    @staticmethod
+    def Install():
+
+        if not isinstance(sys.stdout,Output): sys.stdout = Output(sys.stdout,'out')
+        if not isinstance(sys.stderr,Output): sys.stderr = Output(sys.stderr,'err')
+
+class Index:
+
+    # Name index of the script files in the source directories. A directory is only
+    # listed again when its mtime changed, and the mtime itself is checked at most
+    # once per 'interval' seconds (a miss always checks).
+
+    def __init__(self,paths,interval=1.0):
+
+        self.paths    = paths
+        self.interval = interval
+        self.hits     = 0
+        self.misses   = 0
+        self.scans    = 0
+        self.calls    = 0
+        self.probes   = 0
+        self._entry   = {}
+
+    def find(self,name,collect=False):
+
+        # The unindexed lookup did 2 stat calls for the name itself and 2 per directory
+
+        self.probes += 1
+
+        lst = self.lookup(name,collect,False)
+        if not lst: lst = self.lookup(name,collect,True)
+
+        if lst:
+            self.hits += 1
         else:
+            self.misses += 1
 
-            return txt.format(**hsh)
+        return lst
+
+    def lookup(self,name,collect,force):
+
+        lst = []
+
+        for pth in self.paths:
+
+            if not force: self.probes += 1
+
+            if name in self.names(pth,force):
+                lst.append(f"{pth}/{name}")
+                if not collect: break
+
+        return lst
+
+    def names(self,pth,force=False):
+
+        now   = time.monotonic()
+        entry = self._entry.get(pth)
+
+        if entry and not entry['racy'] and not force and now - entry['checked'] < self.interval:
+            return entry['names']
+
+        self.calls += 1
+
+        try:
+            mtime = os.stat(pth).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        if entry is None or entry['racy'] or entry['mtime'] != mtime:
+
+            self.scans += 1
+
+            names = set()
+            if mtime is not None:
+                with os.scandir(pth) as it:
+                    names = {itm.name for itm in it if itm.is_file()}
+
+            # A listing taken in the same mtime tick as a change can miss that change
+
+            entry = {
+                'mtime' : mtime,
+                'names' : names,
+                'racy'  : mtime is not None and time.time() - mtime / 1e9 < 2
+            }
+            self._entry[pth] = entry
+
+        entry['checked'] = now
+        return entry['names']
+
+    def rescan(self):
+
+        self._entry.clear()
+
+    def stats(self):
+
+        return {
+            'size'   : sum(len(itm['names']) for itm in self._entry.values()),
+            'hits'   : self.hits,
+            'misses' : self.misses,
+            'scans'  : self.scans,
+            'saved'  : 2 * self.probes - self.calls
+        }
 
 class Reader:
 
     def __init__(self,shell):
 
         self._shell   = shell
-        self._session = PromptSession(history=FileHistory(".history"))
+        self._session = None
+        self._history = ".history"
         self._prompt  = ">"
         self._running = True
         self._stdin   = shell.cmdline.flag.get('stdin', True)
         self._lines   = []
+        self.failed   = 0
 
     def line(self):
 
@@ -483,10 +1319,25 @@ class Reader:
             return self._lines.pop(0)
         else:
             if self._stdin:
-                return self._session.prompt(self._prompt)
+                return self.prompt_session().prompt(self._prompt)
             else:
                 return None
 
+    def prompt_session(self):
+
+        # Interactive dependencies are only loaded once a prompt is actually shown
+
+        if self._session is None:
+
+            if self._shell.setting.USE_READLINE: import readline
+
+            from prompt_toolkit import PromptSession
+            from prompt_toolkit.history import FileHistory
+
+            self._session = PromptSession(history=FileHistory(self._history))
+
+        return self._session
+
     def append(self,txt):
 
         self._lines.extend(txt.split("\n"))
@@ -517,24 +1368,193 @@ class Reader:
 
             # Execute command
 
-            self._shell.enter()
-            self._shell.execute(Command(line))
-            self._shell.leave()
+            if not self.run(line): self.failed += 1
+
+    def run(self,line):
+
+        # Background job : <command> &
+
+        if line.endswith('&'):
+            line = line[:-1].strip()
+            background = True
+        else:
+            background = False
+
+        try:
+            cmnd = Command(line)
+        except:
+            traceback.print_exc()
+            return False
+
+        if background:
+            self._shell.background(cmnd)
+            return True
+
+        self._shell.enter()
+        done = self._shell.execute(cmnd)
+        self._shell.leave()
+
+        return done
 
     def session(self,hfile,prompt=">"):
 
-        self._session = PromptSession(history=FileHistory(self._shell.path(hfile)))
+        self._session = None
+        self._history = self._shell.path(hfile)
         self._prompt  = prompt
 
     def prompt(self,val):
 
         self._prompt = val
 
+class Batch(Reader):
+
+    # Headless reader : streams lines from a file or pipe and reports the
+    # status and duration of every command on stderr.
+
+    def __init__(self,shell,stream):
+
+        super().__init__(shell)
+
+        self._stream = stream
+
+    def line(self):
+
+        if len(self._lines)!=0:
+            return self._lines.pop(0)
+
+        line = self._stream.readline()
+        if line == '': return None
+
+        return line
+
+    def run(self,line):
+
+        beg  = time.perf_counter()
+        done = super().run(line)
+        secs = time.perf_counter() - beg
+
+        print(f"BATCH   :  {'ok  ' if done else 'FAIL'} {secs:8.3f}s  {line}",file=sys.stderr)
+
+        return done
+
+    def start(self):
+
+        try:
+            super().start()
+        finally:
+            if self._stream is not sys.stdin: self._stream.close()
+
+    def prompt_session(self):
+
+        log_failure("Batch reader has no prompt")
+
+class Server(Reader):
+
+    # Daemon reader : executes the lines sent by dynashell-client over a unix
+    # domain socket and streams output and status back as json lines.
+
+    class Channel:
+
+        def __init__(self,conn):
+
+            self.conn = conn
+
+        def write(self,key,txt):
+
+            if len(txt): self.conn.sendall((json.dumps({key:txt})+"\n").encode())
+            return len(txt)
+
+    def __init__(self,shell,path):
+
+        super().__init__(shell)
+
+        self._path = path
+
+    def line(self):
+
+        # Only lines appended by scripts, the rest arrives over the socket
+
+        if len(self._lines)!=0:
+            return self._lines.pop(0)
+
+        return None
+
+    def start(self):
+
+        super().start()
+
+        kill_file(self._path)
+        sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+
+        try:
+
+            sock.bind(self._path)
+            os.chmod(self._path,0o600)
+            sock.listen()
+
+            log_inform(f"Listening on {self._path}")
+
+            while self._running:
+
+                conn,_ = sock.accept()
+
+                with conn:
+                    try:
+                        self.serve(conn)
+                    except OSError as e:
+                        log_warning(f"Client connection lost : {e}")
+
+        finally:
+
+            sock.close()
+            kill_file(self._path)
+
+    def serve(self,conn):
+
+        channel = Server.Channel(conn)
+
+        Output.Install()
+
+        for line in conn.makefile('r',encoding='utf-8'):
+
+            line = line.strip()
+            if len(line)==0: continue
+            if line.startswith("#"): continue
+
+            if line=='exit':
+                self.exit()
+                channel.write('out',"Shell stopped\n")
+                conn.sendall((json.dumps({'status':0,'time':0})+"\n").encode())
+                return
+
+            beg = time.perf_counter()
+
+            token = Output.Target.set(channel)
+            try:
+                done = self.run(line)
+            finally:
+                Output.Target.reset(token)
+
+            secs = time.perf_counter() - beg
+            conn.sendall((json.dumps({'status':0 if done else 1,'time':secs})+"\n").encode())
+
 class Command:
 
     def __init__(self,line,data=None,value=None,flag=None):
 
-        cmd = Tokenizer.Parse(line)
+        self.setup(Tokenizer.Parse(line),data,value,flag)
+
+    @staticmethod
+    def Build(cmd,data=None,value=None,flag=None):
+
+        # Command from (kept) Tokenizer.Parse output, skips tokenizing the line again
+
+        self = Command.__new__(Command)
+        self.setup(cmd,data,value,flag)
+
+        return self
+
+    def setup(self,cmd,data,value,flag):
 
         self.name  = cmd["name"]
         self.text  = cmd["text"]
@@ -627,99 +1647,283 @@ class Command:
 
         return len(self.data)==0
 
+class Template:
+
+    # Format string split once into literal and field parts. Fields are looked up by
+    # name (in a mapping or Layers) and passed positionally to a precompiled format
+    # string. Templates using positional or nested fields are left to str.format_map.
+
+    Parser = string.Formatter()
+    Name   = re.compile(r'[^.\[]*')
+
+    def __init__(self,text):
+
+        self.text   = text
+        self.parts  = []
+        self.names  = []
+        self.static = None
+        self.simple = True
+
+        fmt = []
+
+        for (lit,field,spec,conv) in Template.Parser.parse(text):
+
+            if lit:
+                self.parts.append(lit)
+                fmt.append(lit.replace('{','{{').replace('}','}}'))
+
+            if field is None: continue
+
+            name = Template.Name.match(field).group()
+            if name.isdecimal(): name = int(name)
+
+            if not isinstance(name,str) or name == '' or '{' in spec: self.simple = False
+
+            fix  = (f"!{conv}" if conv else "") + (f":{spec}" if spec else "")
+            tail = field[len(str(name)):] + fix
+
+            self.parts.append((name,"{0" + tail + "}","{" + field + fix + "}"))
+            fmt.append("{" + str(len(self.names)) + tail + "}")
+            self.names.append(name)
+
+        if not self.names: self.static = "".join(self.parts)
+
+        self.format = "".join(fmt)
+
+    def render(self,hsh,partial=False):
+
+        if self.static is not None: return self.static
+
+        if not self.simple: return self.text.format_map(Partial(hsh) if partial else hsh)
+
+        maps = hsh.maps if isinstance(hsh,Layers) else (hsh,)
+        vals = []
+
+        for name in self.names:
+
+            for obj in maps:
+                if name in obj:
+                    vals.append(obj[name])
+                    break
+            else:
+                if partial: return self.partial(maps)
+                raise KeyError(name)
+
+        return self.format.format(*vals)
+
+    def partial(self,maps):
+
+        # Missing fields are rendered as their original text
+
+        ret = []
+
+        for itm in self.parts:
+
+            if isinstance(itm,str):
+                ret.append(itm)
+                continue
+
+            (name,fmt,orig) = itm
+
+            for obj in maps:
+                if name in obj:
+                    ret.append(fmt.format(obj[name]))
+                    break
+            else:
+                ret.append(orig)
+
+        return "".join(ret)
+
+class Layers:
+
+    # Read-only lookup through several mappings, the first one holding the key wins
+
+    __slots__ = ('maps',)
+
+    def __init__(self,*maps):
+
+        self.maps = maps
+
+    def __getitem__(self,key):
+
+        for hsh in self.maps:
+            if key in hsh: return hsh[key]
+
+        raise KeyError(key)
+
+class Partial:
+
+    # Lookup that renders missing fields as themselves
+
+    __slots__ = ('hsh',)
+
+    def __init__(self,hsh):
+
+        self.hsh = hsh
+
+    def __getitem__(self,key):
+
+        try:
+            return self.hsh[key]
+        except KeyError:
+            return "{" + key + "}"
+
 class Dictionary:
 
-    Data   = {}
-    Render = {}
+    # The payload lives in the instance itself (no __dict__), attribute access on
+    # the payload goes through __getattribute__/__setattr__.
+
+    __slots__ = ('_data','_render','_views')
 
     def __init__(self,data=None,render=lambda val: val):
 
         if data is None: data = {}
 
-        Dictionary.Data[f"{id(self)}"]   = data
-        Dictionary.Render[f"{id(self)}"] = render
+        object.__setattr__(self,'_data',data)
+        object.__setattr__(self,'_render',render)
+        object.__setattr__(self,'_views',None)
 
     def data(self):
 
-        return Dictionary.Data[f"{id(self)}"]
+        return self._data
 
     def render(self,value):
 
-        return Dictionary.Render[f"{id(self)}"](value)
+        return self._render(value)
 
     def set(self,key,value):
 
-        self.data()[key]=self.render(value)
+        self.forget(key)
+        self._data[key]=self._render(value)
 
     def has(self,key):
 
-        return key in self.data().keys()
+        return key in self._data
 
     # dict api
 
     def clear(self):
-        self.data().clear()
+        self.forget()
+        self._data.clear()
 
     def copy(self):
-        return self.data().copy()
+        return self._data.copy()
 
     def fromkeys(self,keys,value=None):
-        return self.data().fromkeys(keys,value)
+        return self._data.fromkeys(keys,value)
 
     def get(self,key,value=None):
-        return self.data().get(key,value)
+        return self._data.get(key,value)
 
     def items(self):
-        return self.data().items()
+        return self._data.items()
 
     def keys(self):
-        return self.data().keys()
+        return self._data.keys()
 
     def pop(self,key,defval):
-        return self.data().pop(key,defval)
+        self.forget(key)
+        return self._data.pop(key,defval)
 
     def popitem(self):
-        return self.data().popitem()
+        self.forget()
+        return self._data.popitem()
 
     def setdefault(self,key,defval):
-        self.data().setdefault(key,self.render(defval))
+        self._data.setdefault(key,self._render(defval))
 
     def update(self,hash):
-        self.data().update(hash)
+        self.forget()
+        self._data.update(hash)
 
     def values(self):
-        return self.data().values()
+        return self._data.values()
 
     #
 
     def __str__(self):
 
-        return f"{self.data()}"
+        return f"{self._data}"
 
-    def __getattr__(self,key):
+    def __getattribute__(self,key):
+
+        # Methods and slots (of the class or a subclass) first, then the payload
+        # (unknown keys read as None)
+
+        if key in type(self).Attributes: return object.__getattribute__(self,key)
+
+        data = Dictionary._data.__get__(self)
+        if key not in data: return None # log_failure(f"Undefined dictionary entry {key} encountered")
+
+        obj = data[key]
+        if not isinstance(obj,dict): return obj
 
-        if not self.has(key): return None # log_failure(f"Undefined dictionary entry {key} encountered")
-        return self.cast(self.get(key))
+        # Fast path for a memoized nested view
+
+        views = Dictionary._views.__get__(self)
+        if views is not None:
+            view = views.get(key)
+            if view is not None and Dictionary._data.__get__(view) is obj: return view
+
+        return self.cast(obj,key)
 
     def __setattr__(self,key,value):
 
-        self.data()[key]=self.render(value)
+        # Slots are only set this way by copy/pickle, everything else is payload
+
+        if key in Dictionary.__slots__: return object.__setattr__(self,key,value)
+
+        self.forget(key)
+        self._data[key]=self._render(value)
 
     def __getitem__(self,idx):
 
-        return self.get(idx)
+        return self._data.get(idx)
 
     def __setitem__(self, idx, value):
 
-        self.set(idx,self.render(value))
+        self.set(idx,self._render(value))
 
-    def cast(self,obj):
+    def cast(self,obj,key=None):
 
         if isinstance(obj,dict):
-            return Dictionary(obj)
+
+            if key is None: return Dictionary(obj)
+
+            # Nested views are reused for as long as the key holds the same dict
+
+            views = self._views
+            if views is None:
+                views = {}
+                object.__setattr__(self,'_views',views)
+
+            view = views.get(key)
+            if view is None or view._data is not obj:
+                view = views[key] = Dictionary(obj)
+
+            return view
+
         else:
             return obj
 
+    def forget(self,key=None):
+
+        views = getattr(self,'_views',None)
+
+        if views:
+            if key is None:
+                views.clear()
+            else:
+                views.pop(key,None)
+
+    def __init_subclass__(cls,**kwargs):
+
+        super().__init_subclass__(**kwargs)
+        cls.Attributes = frozenset(dir(cls))
+
+Dictionary.Attributes = frozenset(dir(Dictionary))
+Dictionary.Payload    = Dictionary._data.__get__
+
 class Token:
 
     DATA    = 1
@@ -738,12 +1942,25 @@ class Token:
 
 class Tokenizer:
 
+    # The buffer is never copied : 'pos' is the read position in 'src' and 'end' the
+    # position after which only whitespace remains.
+
+    SPACE   = re.compile(r'\s*')
+    WORD    = re.compile(r'[^ =]*')
+    LITERAL = re.compile(r'\S*')
+
     def __init__(self,src):
 
         self.src = src
-        self.buf = src
+        self.pos = 0
+        self.end = len(src.rstrip())
         self.tok = None
 
+    @property
+    def buf(self):
+
+        return self.src[self.pos:]
+
     def parse(self):
 
         lst = []
@@ -782,31 +1999,31 @@ class Tokenizer:
 
         if checker:
             if not self.done():
-                return checker(self.buf[0])
+                return checker(self.src[self.pos])
             else:
                 return False
         else:
-            return self.buf[0]
+            return self.src[self.pos]
 
     def next(self):
 
-        ch = self.buf[0]
-        self.buf = self.buf[1:]
+        ch = self.src[self.pos]
+        self.pos += 1
         return ch
 
     def done(self):
 
-        return len(self.buf)==0 or self.buf.isspace()
+        return self.pos >= self.end
 
     def trim(self):
 
-        self.buf = self.buf.lstrip()
+        self.pos = Tokenizer.SPACE.match(self.src,self.pos).end()
 
     def scan(self,tst):
 
         self.trim()
-        if self.buf.startswith(tst):
-            self.buf = self.buf[len(tst):]
+        if self.src.startswith(tst,self.pos):
+            self.pos += len(tst)
             return True
         else:
             return False
@@ -822,14 +2039,16 @@ class Tokenizer:
 
     def read_chars(self,cset):
 
-        tmp = ''
-        while self.peek(lambda ch: ch in cset): tmp += self.next()
-        return tmp
+        beg = self.pos
+        while self.peek(lambda ch: ch in cset): self.pos += 1
+        return self.src[beg:self.pos]
 
     def read_word(self):
 
-        word = ''
-        while self.peek() not in ' =': word += self.next()
+        beg = self.pos
+        self.pos = Tokenizer.WORD.match(self.src,beg).end()
+        if self.pos >= len(self.src): self.peek()
+        word = self.src[beg:self.pos]
         if is_empty(word): log_failure("Word is empty")
         return word
 
@@ -844,14 +2063,16 @@ class Tokenizer:
 
         # literal
 
-        tmp = ''
-        while self.peek(lambda ch : not ch.isspace()): tmp += self.next()
-        return tmp
+        beg = self.pos
+        self.pos = Tokenizer.LITERAL.match(self.src,beg).end()
+        return self.src[beg:self.pos]
 
     def read_string(self,tr):
 
-        tmp = ''
-        while self.peek(lambda ch : ch != tr): tmp += self.next()
+        beg = self.pos
+        idx = self.src.find(tr,beg,self.end)
+        self.pos = self.end if idx < 0 else idx
+        tmp = self.src[beg:self.pos]
         self.next()
         return tmp
 
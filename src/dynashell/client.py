@@ -0,0 +1,70 @@
+import os
+import sys
+import json
+import socket
+import threading
+
+# Thin client for a shell started with --serve. Only uses the standard library so
+# it starts in milliseconds.
+#
+#   dynashell-client [--socket=<file>|--config=<file>] <command line>
+#   dynashell-client [--socket=<file>|--config=<file>] < <command file>
+
+def client(args, stdin=None):
+
+    # Same default as the server : dynashell.sock next to the configuration file
+
+    config = './config.yaml'
+    path   = os.environ.get('DYNASHELL_SOCKET')
+
+    while len(args) and args[0].startswith(('--socket=','--config=')):
+        (key,val) = args[0][2:].split('=',1)
+        if key == 'socket': path = val
+        if key == 'config': config = val
+        args = args[1:]
+
+    if path is None: path = os.path.join(os.path.dirname(os.path.abspath(config)),'dynashell.sock')
+
+    sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+
+    try:
+        sock.connect(path)
+    except OSError as e:
+        sys.stderr.write(f"dynashell-client : can't connect to {path} ({e.strerror})\n")
+        return 2
+
+    # Send from a separate thread so large inputs can't deadlock against the output
+
+    def send():
+        if len(args):
+            sock.sendall((' '.join(args)+"\n").encode())
+        else:
+            for line in (stdin or sys.stdin): sock.sendall(line.encode())
+        sock.shutdown(socket.SHUT_WR)
+
+    sender = threading.Thread(target=send,daemon=True)
+    sender.start()
+
+    status = 0
+
+    with sock:
+        for msg in sock.makefile('r',encoding='utf-8'):
+            msg = json.loads(msg)
+            if 'out' in msg:
+                sys.stdout.write(msg['out'])
+            elif 'err' in msg:
+                sys.stderr.write(msg['err'])
+            elif msg.get('status'):
+                status = msg.get('status')
+
+    sys.stdout.flush()
+
+    return status
+
+# Script hook behind 'dynashell-client' module script
+def run_client():
+    sys.exit(client(sys.argv[1:]))
+
+# Alternative client execution via 'python -m dynashell.client ...'
+if __name__ == "__main__":
+    sys.exit(client(sys.argv[1:]))
@@ -41,6 +41,7 @@ def feature_macros(self):
             (typ,fnc)=args
             if not is_none(self._macro.get(typ)) : log_warning(f"Macro for '@{typ}' already defined")
             self._macro[typ] = fnc
+            self.reparse()
 
     # System Macros
 
@@ -106,57 +107,95 @@ def feature_handlers(self):
 
     # Methods
 
-    def handler(self,*args): # wrd1,wrd2,fnc
+    def handler(self,*args): # path,fnc or wrd1,wrd2,fnc
 
-        # handler({...})
+        # handler({...}) : nested dicts of words, with the functions as leaves
 
         if len(args)==1:
 
-            for verb,hsh in args[0].items():
-                for noun,fnc in hsh.items():
-                    self.handler(verb,noun,fnc)
+            def walk(path,hsh):
+                for wrd,itm in hsh.items():
+                    if isinstance(itm,dict):
+                        walk(path + [wrd],itm)
+                    else:
+                        self.handler(path + [wrd],itm)
 
+            walk([],args[0])
             return
 
-        # handler(verb,noun,fnc)
+        # handler("show table stats",fnc), handler([...],fnc) or handler(verb,noun,fnc)
 
-        if len(args)==3:
+        if len(args)==2:
+            (path,fnc) = args
+            path = path.split() if isinstance(path,str) else list(path)
+        else:
+            path = list(args[:-1])
+            fnc  = args[-1]
 
-            (verb,noun,fnc)=args
+        if not len(path): log_failure("Handler needs at least one word")
 
-            if self._handler.get(verb) is None:
-                self._handler[verb] = {}
+        # Words are stored in a trie of dicts, the function of a node under None
 
-            if not is_none(self._handler.get(verb).get(noun)): log_warning(f"Handler for '{verb} {noun}' already defined")
+        node = self._handler.setdefault(path[0],{})
+        for wrd in path[1:]: node = node.setdefault(wrd,{})
 
-            self._handler[verb][noun] = fnc
+        if not is_none(node.get(None)): log_warning(f"Handler for '{' '.join(path)}' already defined")
 
-            return
+        node[None] = fnc
+        self.route(path[0],executor,'handler',self._handler[path[0]])
 
     # Executor
 
     def executor(self,cmnd):
 
-        if self._handler.get(cmnd.name):
+        # Single pass over the command words, following every matching branch (exact
+        # words and '*') at once. The deepest node with a function wins, between nodes
+        # of the same depth the one with the earliest exact word. Matched words are
+        # taken from the command.
+
+        node  = self._handler[cmnd.name]
+        best  = node.get(None)
+        data  = cmnd.data
+        level = [node]
+        size  = 0
+        idx   = 0
+
+        for wrd in data:
+
+            nxt = []
 
-            verb = cmnd.name
-            noun = cmnd.pop()
+            for node in level:
+                child = node.get(wrd)
+                if child is not None: nxt.append(child)
+                if wrd != '*':
+                    child = node.get('*')
+                    if child is not None: nxt.append(child)
 
-            if noun is None: return False
+            if not nxt: break
 
-            if noun in self._handler[verb].keys():
+            level = nxt
+            idx  += 1
 
-                self._handler[verb][noun](self,verb,noun,cmnd)
-                return True
+            for node in level:
+                fnc = node.get(None)
+                if fnc is not None:
+                    best = fnc
+                    size = idx
+                    break
 
-            if '*' in self._handler[verb].keys():
+        if best is None: return False
 
-                self._handler[verb]['*'](self,verb,noun,cmnd)
-                return True
+        # verb noun : the common case, without slicing
 
-            cmnd.push(noun)
+        if size == 1:
+            best(self,cmnd.name,data.pop(0),cmnd)
+            return True
+
+        words = data[:size]
+        del data[:size]
 
-        return False
+        best(self,cmnd.name,*words,cmnd)
+        return True
 
     # Define
 
@@ -166,8 +205,7 @@ def feature_handlers(self):
         },
         'method': {
             'handler': handler
-        },
-        'executor': executor
+        }
     })
 
 # -----
@@ -194,6 +232,7 @@ def feature_formatters(self):
 
             if not is_none(self._formatter.get(typ)) : log_warning(f"Formatter for '{typ}' already defined")
             self._formatter[typ] = fnc
+            self.reparse()
 
     # Parser
 
@@ -324,7 +363,8 @@ def feature_processors(self):
         def render(self, src, **kwargs):
 
             if isinstance(src, str):
-                return src.format(**self._hash, **kwargs, **self.shell.setting)
+                from dynashell.classes import Layers, Dictionary
+                return self.shell.template(src).render(Layers(kwargs, self._hash, Dictionary.Payload(self.shell.setting)))
             else:
                 return src
 
@@ -353,7 +393,11 @@ def feature_processors(self):
             fnc = _shell._processor.get(key)
             if is_none(fnc): log_failure(f"Context method {key} has not been registered")
             ctx = Context.Create(*args, **kwargs)
-            fnc(ctx)
+            res = fnc(ctx)
+
+            # Coroutine processors run on the shell event loop
+
+            if inspect.isawaitable(res): _shell.run(res)
 
 
         @staticmethod
@@ -389,17 +433,14 @@ def feature_processors(self):
     def processor(self,fnc):
 
         self._processor[fnc.__name__] = fnc
+        self.route(fnc.__name__,executor,'processor',fnc)
 
     # Executor
 
     def executor(self,cmnd):
 
-        if self._processor.get(cmnd.name):
-
-            Context.Invoke(cmnd.name,*cmnd.data, **cmnd.value)
-            return True
-
-        return False
+        Context.Invoke(cmnd.name,*cmnd.data, **cmnd.value)
+        return True
 
     # Define
 
@@ -409,8 +450,7 @@ def feature_processors(self):
         },
         'method': {
             'processor': processor
-        },
-        'executor': executor
+        }
     })
 
 def processor(fnc):
@@ -461,15 +501,7 @@ def feature_scripter(self):
 
     class Scripter:
 
-        def __init__(self,shell):
-
-            self.shell   = shell
-            self.header  = ""
-            self.handler = {}
-
-        def parse_script(self,script):
-
-            pycode = dedent("""
+        Prologue = dedent("""
             from dynashell.classes import *
             #from textwrap import dedent
     
@@ -477,15 +509,42 @@ def feature_scripter(self):
             data  = command.data
             flag  = command.flag
             body  = command.body           
+            _call = shell.scripter().call
              
             """)
 
-            pycode += self.header
+        def __init__(self,shell):
+
+            self.shell   = shell
+            self.header  = ""
+            self.version = 0
+            self.handler = {}
+            self.binding = []
+            self._bound  = {}
+            self._lock   = threading.Lock()
+
+        def parse_script(self,script):
+
+            # Translation only depends on the script text and the registered header
+
+            key    = (script, self.version)
+            cache  = self.cache()
+            pycode = cache.get(key)
 
-            source = script.splitlines()
-            while len(source):
+            if pycode is None: pycode = cache.put(key, self.translate(script))
+
+            if self.shell.command.flag.get('debug',False):
+                print(f"=====\n{self.shell.command}\n{pycode}\n=====\n")
+
+            return pycode
+
+        def translate(self,script):
+
+            pycode = [Scripter.Prologue, self.header]
+
+            source = iter(script.splitlines())
+            for line in source:
 
-                line = source.pop(0)
                 tail = line.lstrip()
 
                 if tail.startswith('@'):
@@ -506,28 +565,31 @@ def feature_scripter(self):
                     rslt = self.invoke(hdlr,text,body)
                     if rslt is None: log_failure(f"Script has no handler for @{hdlr}")
                     rslt = dedent(rslt)
-                    for part in rslt.splitlines(): pycode += head + part + "\n"
+                    for part in rslt.splitlines(): pycode.append(head + part + "\n")
 
                 else:
 
-                    pycode += self.parse_line(line)
-
-            if self.shell.command.flag.get('debug',False):
-                print(f"=====\n{self.shell.command}\n{pycode}\n=====\n")
+                    pycode.append(self.parse_line(line))
 
-            return pycode
+            return "".join(pycode)
 
         def parse_body(self,lines):
 
-            txt = ""
+            txt = []
+
+            for line in lines:
+                line = line.rstrip()
+                if line.lstrip().startswith('}'): return dedent("".join(txt))
+                txt.append(self.parse_line(line))
+
+            log_failure("Script body is not closed with '}'")
 
-            line = lines.pop(0).rstrip()
+        def cache(self):
 
-            while not line.lstrip().startswith('}'):
-                txt += self.parse_line(line)
-                line = lines.pop(0).rstrip()
+            cache = self.shell._cache.get('scripter')
+            if cache is None: cache = self.shell._cache.setdefault('scripter',LruCache(int(self.shell.setting.PARSE_CACHE)))
 
-            return dedent(txt)
+            return cache
 
         def parse_line(self,line):
 
@@ -547,21 +609,87 @@ def feature_scripter(self):
 
             if header is not None:
                 self.header += "\n"+dedent(header)
+                self.version += 1
+                self.shell.reparse()
 
             if handler is not None:
                 for (k,v) in handler.items():
                     self.handler[k] = v
+                self.version += 1
+                self.shell.reparse()
 
         def invoke(self, hdlr, text, body):
 
-            if body is None:
-                bid = None
+            # Resolve the handler once, the translated code calls its binding by index
+
+            return f"_call({self.bind(hdlr,text,body)})"
+
+        def bind(self, hdlr, text, body):
+
+            from dynashell.classes import Template, Tokenizer
+
+            # Text that is not a valid format string stays raw, it is only rendered (and
+            # fails) when the line actually runs
+
+            def template(txt):
+                try:
+                    return Template(txt)
+                except ValueError:
+                    return txt
+
+            text = template(text) if len(text) else None
+            body = template(body) if body is not None else None
+            fnc  = self.handler.get(hdlr)
+            cmd  = None
+
+            # Source defined handler with a fixed text : tokenize its command line once
+
+            fixed = text is None or (isinstance(text,Template) and text.static is not None)
+
+            if fnc is None and fixed and self.shell.resolve(hdlr):
+                cmd = Tokenizer.Parse(hdlr if text is None else f"{hdlr} {text.static}")
+
+            key = (hdlr, getattr(text,'text',text), getattr(body,'text',body), fnc)
+
+            with self._lock:
+
+                bid = self._bound.get(key)
+
+                if bid is None:
+                    bid = len(self.binding)
+                    self.binding.append(Binding(hdlr,text,body,fnc,cmd))
+                    self._bound[key] = bid
+
+            return bid
+
+        def call(self, bid):
+
+            bnd  = self.binding[bid]
+            text = self.shell.render(bnd.text) if bnd.text is not None else None
+
+            if bnd.body is None:
+                body = None
+            elif bnd.static is not None:
+                body = bnd.static
+            else:
+                body = dedent(self.shell.render(bnd.body,partial=True))
+
+            if bnd.fnc is not None:
+
+                bnd.fnc(self.shell, self.shell.command, text, body)
+
+            elif bnd.cmd is not None:
+
+                from dynashell.classes import Command
+                cmnd = Command.Build(bnd.cmd,value=self.shell.command.value,flag=self.shell.command.flag)
+                cmnd.body = body
+                self.shell.execute(cmnd)
+
             else:
-                bid = unique_id()
-                self.shell.set(bid,body,transient=True)
-                bid = f"'{bid}'"
 
-            return f"shell.scripter().execute('{hdlr}','{text}',{bid})"
+                # Not resolved at translation time, look it up now
+
+                self.dispatch(bnd.hdlr,text,body)
 
         def execute(self, hdlr, text, bid):
 
@@ -585,6 +713,10 @@ def feature_scripter(self):
                     #body = bid
                     body = dedent(self.shell.render(bid,partial=True))
 
+            self.dispatch(hdlr,text,body)
+
+        def dispatch(self, hdlr, text, body):
+
             # scripter defined handler
 
             if self.handler.get(hdlr):
@@ -605,6 +737,20 @@ def feature_scripter(self):
 
             log_failure(f"Don't know how to handle {hdlr}")
 
+    class Binding:
+
+        # A translated @hdlr line : pre-split text and body templates, and the handler
+        # function or the tokenized command line of the script it runs
+
+        def __init__(self,hdlr,text,body,fnc,cmd):
+
+            self.hdlr   = hdlr
+            self.text   = text
+            self.body   = body
+            self.fnc    = fnc
+            self.cmd    = cmd
+            self.static = dedent(body.static) if getattr(body,'static',None) is not None else None
+
     self.feature({
 
         'field': {
@@ -653,4 +799,138 @@ def feature_forwarder(self):
             'forwarder': forwarder
         },
         'executor': executor
-    })
\ No newline at end of file
+    })
+
+# -----
+# Feature : reloader
+# -----
+
+def feature_reloader(self):
+
+    import importlib
+    import traceback
+
+    shell(self)
+
+    class Reloader:
+
+        def __init__(self,shell):
+
+            self.shell   = shell
+            self.file    = {}
+            self.stamp   = {}
+            self.marker  = None
+            self.reloads = 0
+
+        def track(self):
+
+            # Only look for new modules when sys.modules changed since the last look
+
+            marker = (len(sys.modules),next(reversed(sys.modules)))
+            if marker == self.marker: return
+            self.marker = marker
+
+            roots = tuple(f"{pth}/" for pth in self.shell._module if pth != self.shell._path.get('temp'))
+
+            for name,mod in list(sys.modules.items()):
+
+                if name in self.file: continue
+
+                file = getattr(mod,'__file__',None)
+                if file and slashed_path(file).startswith(roots):
+                    self.file[name]  = file
+                    self.stamp[name] = file_stamp(file)
+
+        def check(self):
+
+            self.track()
+
+            # Stat sweep (the only cost when nothing changed)
+
+            changed = []
+
+            for name,file in list(self.file.items()):
+
+                if name not in sys.modules:
+                    del self.file[name]
+                    del self.stamp[name]
+                    continue
+
+                if file_stamp(file) != self.stamp[name]: changed.append(name)
+
+            if len(changed): self.reload(changed)
+
+        def depends(self,name):
+
+            ret = set()
+
+            for val in list(vars(sys.modules[name]).values()):
+
+                if isinstance(val,ModuleType):
+                    dep = val.__name__
+                    if dep.startswith(f"{name}."): continue # a package does not depend on its submodules
+                else:
+                    dep = getattr(val,'__module__',None)
+
+                if dep != name and dep in self.file: ret.add(dep)
+
+            return ret
+
+        def reload(self,changed):
+
+            graph = {name:self.depends(name) for name in self.file}
+
+            # Changed modules plus everything that (transitively) depends on them
+
+            todo = set(changed)
+            grow = True
+
+            while grow:
+                grow = False
+                for name,deps in graph.items():
+                    if name not in todo and deps & todo:
+                        todo.add(name)
+                        grow = True
+
+            # Reload dependencies before their dependents
+
+            done = set()
+
+            def visit(name,path=()):
+
+                if name in done or name in path: return
+                for dep in graph[name] & todo: visit(dep,path+(name,))
+                done.add(name)
+
+                try:
+                    importlib.reload(sys.modules[name])
+                    self.reloads += 1
+                    log_inform(f"Reloaded module '{name}'")
+                except:
+                    traceback.print_exc()
+
+                self.stamp[name] = file_stamp(self.file[name])
+
+            for name in sorted(todo): visit(name)
+
+            # The include namespace may hold names taken from the old modules
+
+            self.shell._header = None
+
+        def stats(self):
+
+            return {'size':len(self.file),'reloads':self.reloads}
+
+    # Define
+
+    reloader = Reloader(self)
+
+    self.feature({
+        'field': {
+            '_reloader': reloader
+        },
+        'method': {
+            'reloader': lambda self: self._reloader
+        },
+        'enter': lambda self: self._reloader.check()
+    })
@@ -7,8 +7,8 @@ def instance():
 
 # Script hook behind 'dynashell' module script
 def run_shell():
-    Shell(' '.join(sys.argv))
+    sys.exit(Shell(' '.join(sys.argv)).status)
 
 # Alternative shell execution via 'python -m dynashell.main ...'
 if __name__ == "__main__":
-    Shell(' '.join(sys.argv))
\ No newline at end of file
+    sys.exit(Shell(' '.join(sys.argv)).status)
\ No newline at end of file
@@ -4,13 +4,21 @@ from importlib import resources as resource_loader
 import yaml
 import json
 import shutil
+import tempfile
 import os
 import types
 import importlib.util
+import hashlib
+import marshal
 import sys
 from pathlib import Path
 from types import ModuleType
 import inspect as inspect
+from collections import OrderedDict
+from concurrent.futures import Future
+import threading
+import queue
+import time
 
 # log_ methods
 
@@ -94,6 +102,15 @@ def set_environ(key, val):
 
     os.environ[key]=val
 
+def file_stamp(file):
+
+    try:
+        stat = os.stat(file)
+    except OSError:
+        return None
+
+    return (stat.st_mtime_ns,stat.st_size)
+
 def load_file(file):
 
     if not is_file(file): log_failure(f"File '{file}' does not exist")
@@ -149,6 +166,40 @@ def dump_json(data):
 
     return json.dumps(data, indent=4, cls=DecimalEncoder)
 
+def load_code(file, digest):
+
+    # Returns None when the file is missing, stale or written by another Python version
+
+    if not is_file(file): return None
+
+    with open(file,'rb') as f:
+        data = f.read()
+
+    head = importlib.util.MAGIC_NUMBER + digest
+    if not data.startswith(head): return None
+
+    try:
+        return marshal.loads(data[len(head):])
+    except (EOFError,ValueError,TypeError):
+        return None
+
+def save_code(file, digest, code):
+
+    create_dir(os.path.dirname(file))
+
+    # Write to a private file first so concurrent shells (and threads) never read a partial file
+
+    (fd,temp) = tempfile.mkstemp(dir=os.path.dirname(file),prefix=os.path.basename(file)+'.')
+
+    try:
+        with os.fdopen(fd,'wb') as f:
+            f.write(importlib.util.MAGIC_NUMBER + digest)
+            f.write(marshal.dumps(code))
+        os.replace(temp,file)
+    except BaseException:
+        kill_file(temp)
+        raise
+
 def slashed_path(path):
 
     path = path.replace('\\','/')
@@ -271,13 +322,20 @@ def load_resource(filename, package=None):
 
     return ret
 
-def import_from_string(module_name, source_code):
+def import_from_string(module_name, source_code, *namespaces):
     spec = importlib.util.spec_from_loader(module_name, loader=None)
     module = importlib.util.module_from_spec(spec)
-    exec(source_code, module.__dict__)
     sys.modules[spec.name] = module
+    for namespace in namespaces: module.__dict__.update(namespace)
+    exec(source_code, module.__dict__)
     return module
 
+def sizeof_namespace(hsh):
+
+    # Shallow estimate : the namespace dict plus the objects it references directly
+
+    return sys.getsizeof(hsh) + sum(sys.getsizeof(val) for key,val in hsh.items() if key not in ('__builtins__','__anchor__'))
+
 def str_to_type(txt):
 
     if not isinstance(txt,str): return txt
@@ -304,4 +362,235 @@ def str_to_type(txt):
     if txt.startswith('"') | txt.startswith('\''):
         return txt[1:-1]
 
-    return txt
\ No newline at end of file
+    return txt
+
+class LruCache:
+
+    def __init__(self,size=128):
+
+        self.size   = size
+        self.hits   = 0
+        self.misses = 0
+        self._data  = OrderedDict()
+        self._lock  = threading.Lock()
+
+    def get(self,key,default=None):
+
+        with self._lock:
+
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+
+            self.misses += 1
+            return default
+
+    def put(self,key,val):
+
+        if self.size <= 0: return val
+
+        with self._lock:
+
+            self._data[key] = val
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+        return val
+
+    def drop(self,key):
+
+        with self._lock:
+            self._data.pop(key,None)
+
+    def clear(self):
+
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+
+        return {'size':len(self._data),'limit':self.size,'hits':self.hits,'misses':self.misses}
+
+class Pool:
+
+    # Minimal thread pool on daemon threads, so a task that hangs never blocks
+    # interpreter exit. Threads are started on demand up to 'size'.
+
+    def __init__(self,size=4):
+
+        self.size     = size
+        self._queue   = queue.SimpleQueue()
+        self._threads = []
+        self._lock    = threading.Lock()
+
+    def submit(self,fnc,*args,**kwargs):
+
+        return self.put(Future(),fnc,*args,**kwargs)
+
+    def put(self,future,fnc,*args,**kwargs):
+
+        # Run fnc for a future the caller already holds (and published)
+
+        self._queue.put((future,fnc,args,kwargs))
+
+        with self._lock:
+            if len(self._threads) < self.size:
+                thread = threading.Thread(target=self.work,daemon=True,name=f"dynashell-{len(self._threads)}")
+                self._threads.append(thread)
+                thread.start()
+
+        return future
+
+    def work(self):
+
+        while True:
+
+            item = self._queue.get()
+            if item is None: return
+
+            (future,fnc,args,kwargs) = item
+            if not future.set_running_or_notify_cancel(): continue
+
+            try:
+                future.set_result(fnc(*args,**kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def shutdown(self):
+
+        with self._lock:
+            for thread in self._threads: self._queue.put(None)
+            self._threads = []
+
+def split_line(txt, sep=';'):
+
+    # Split on sep outside of single/double quoted parts
+
+    ret = []
+    beg = 0
+    quote = None
+
+    for idx,ch in enumerate(txt):
+        if quote:
+            if ch == quote: quote = None
+        elif ch in '"\'':
+            quote = ch
+        elif ch == sep:
+            ret.append(txt[beg:idx])
+            beg = idx + 1
+
+    ret.append(txt[beg:])
+    return ret
+
+def run_graph(graph, fnc, strict=True, timeout=None, limit=None, inline=False):
+
+    # Run fnc(name) for every node of graph ({name: [after, ...]}) on daemon threads,
+    # a node starts as soon as all the nodes it comes after have ended. With strict
+    # a node is skipped when one of them did not succeed. A node running longer than
+    # timeout seconds is abandoned, when limit seconds have passed all running nodes
+    # are abandoned and the remaining ones skipped. With inline (or when no thread can
+    # be started) the nodes run one at a time in the calling thread, in dependency order,
+    # and can't be abandoned. Returns {name: hsh} with state (done, failed, timeout,
+    # skipped), started, ended and error.
+
+    for name,after in graph.items():
+        for dep in after:
+            if dep not in graph: raise ValueError(f"'{name}' runs after unknown '{dep}'")
+
+    order = {name: set(after) for name,after in graph.items()}
+    while order:
+        ready = [name for name,after in order.items() if not after]
+        if not ready: raise ValueError(f"Circular dependency between {', '.join(order)}")
+        for name in ready: del order[name]
+        for after in order.values(): after.difference_update(ready)
+
+    ret     = {name: {'state': None, 'started': None, 'ended': None, 'error': None} for name in graph}
+    waiting = {name: set(after) for name,after in graph.items()}
+    ended   = queue.SimpleQueue()
+    running = set()
+    final   = time.perf_counter() + limit if limit is not None else None
+
+    def work(name):
+        try:
+            ok,err = (fnc(name) is not False),None
+        except BaseException as e:
+            ok,err = False,e
+        ended.put((name,ok,err,time.perf_counter()))
+
+    def finish(name,state,tim=None):
+        ret[name]['state'] = state
+        ret[name]['ended'] = tim
+        running.discard(name)
+        for itm in waiting.values(): itm.discard(name)
+
+    while waiting or running:
+
+        # Start or skip every node whose predecessors have all ended
+
+        ready = [name for name,after in waiting.items() if not after]
+
+        for name in ready:
+            del waiting[name]
+            if strict and any(ret[dep]['state'] != 'done' for dep in graph[name]):
+                finish(name,'skipped')
+                continue
+            if final is not None and time.perf_counter() >= final:
+                finish(name,'skipped')
+                continue
+            ret[name]['started'] = time.perf_counter()
+            if not inline:
+                try:
+                    threading.Thread(target=work,args=(name,),daemon=True,name=f"dynashell-{name}").start()
+                    running.add(name)
+                    continue
+                except RuntimeError:
+                    pass # No new threads at interpreter shutdown : run it here
+            work(name)
+            (name,ok,err,tim) = ended.get()
+            ret[name]['error'] = err
+            finish(name,'done' if ok else 'failed',tim)
+
+        if not running or any(not after for after in waiting.values()): continue
+
+        # Wait for the next node to end, or the first deadline to pass
+
+        lst = [ret[name]['started'] + timeout for name in running] if timeout is not None else []
+        if final is not None: lst.append(final)
+
+        try:
+            (name,ok,err,tim) = ended.get(timeout=max(0.0, min(lst) - time.perf_counter())) if lst else ended.get()
+            if name in running:
+                ret[name]['error'] = err
+                finish(name,'done' if ok else 'failed',tim)
+        except queue.Empty:
+            pass
+
+        now = time.perf_counter()
+
+        for name in list(running):
+            if timeout is not None and now >= ret[name]['started'] + timeout: finish(name,'timeout',now)
+
+        if final is not None and now >= final:
+            for name in list(running): finish(name,'timeout',now)
+            for name in list(waiting): del waiting[name]; ret[name]['state'] = 'skipped'
+
+    return ret
+
+def critical_path(graph, result):
+
+    # Longest chain of node durations through graph, returns (seconds, [name, ...])
+
+    best = {}
+
+    def walk(name):
+        if name not in best:
+            hsh = result[name]
+            own = (hsh['ended'] - hsh['started']) if hsh['ended'] is not None else 0.0
+            pre = max((walk(dep) for dep in graph[name]), key=lambda x: x[0], default=(0.0,[]))
+            best[name] = (pre[0] + own, pre[1] + [name])
+        return best[name]
+
+    return max((walk(name) for name in graph), key=lambda x: x[0], default=(0.0,[]))